@@ -0,0 +1,21 @@
+import os
+import importlib.util
+from dotenv import load_dotenv
+
+# --- Hypercorn Configuration ---
+# Production entrypoint:
+#   hypercorn --config file:hypercorn_conf.py telegram_flask_verification_bot:app
+
+load_dotenv()
+
+bind = [f"0.0.0.0:{os.getenv('PORT', 5000)}"]
+# uvloop's faster event loop where it is installed (not available on Windows).
+worker_class = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+backlog = 2048
+
+# A single worker: the bot's rate limiting is per process - AIORateLimiter's global and
+# per-group limits, the spacing between admin notifications and the fallback reply bucket -
+# so N workers would send up to N times Telegram's limits, and N admin senders would break
+# the 1 msg/sec per-chat limit on ADMIN_CHAT_ID. Updates are I/O-bound and already run
+# concurrently on the worker's event loop, so one worker covers the bot's webhook traffic.
+workers = 1
@@ -1,9 +1,8 @@
 import asyncio
 import os
 import logging
-from telegram import Update # Import Update directly from telegram
 from telegram.ext import Application
-# Removed: from telegram.constants import Update as TelegramUpdateType # Renamed Update for clarity
+from telegram.constants import UpdateType
 from dotenv import load_dotenv
 
 # --- Configure Logging ---
@@ -25,6 +24,13 @@ if RENDER_EXTERNAL_HOSTNAME:
 else:
     WEBHOOK_URL = os.getenv("WEBHOOK_URL") # Ensure this is explicitly set in your .env for local testing of this script
 
+# Update types handled by telegram_flask_verification_bot: /start, contact and text
+# messages arrive as "message", join requests as "chat_join_request" and taps on the
+# inline verification button as "callback_query".
+ALLOWED_UPDATES = [UpdateType.MESSAGE, UpdateType.CHAT_JOIN_REQUEST, UpdateType.CALLBACK_QUERY]
+# Raises Telegram's parallel webhook deliveries above the default of 40.
+WEBHOOK_MAX_CONNECTIONS = 100
+
 async def set_telegram_webhook():
     if not BOT_TOKEN:
         logger.error("TELEGRAM_BOT_TOKEN environment variable is not set. Cannot set webhook.")
@@ -35,28 +41,32 @@ async def set_telegram_webhook():
 
     # Create a minimal Application instance just for webhook operations
     # No need for handlers or full setup here, as this is a temporary app for webhook setting.
-    # We explicitly set a new event loop here to ensure it's clean for this script.
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError: # No running loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    
     application = Application.builder().token(BOT_TOKEN).build()
-    application.loop = loop # Assign the loop to this temporary application
 
     try:
-        logger.info(f"Attempting to clear any old webhooks...")
-        await application.bot.set_webhook(url="") # Clear any old webhook
-        logger.info("Old webhooks cleared.")
+        # Skip the update when the webhook is already configured as desired; otherwise
+        # set_webhook replaces any old webhook in one call, no need to clear it first.
+        webhook_info = await application.bot.get_webhook_info()
+        if (
+            webhook_info.url == WEBHOOK_URL
+            and set(webhook_info.allowed_updates) == set(ALLOWED_UPDATES)
+            and webhook_info.max_connections == WEBHOOK_MAX_CONNECTIONS
+        ):
+            logger.info("Webhook is already set to: %s. Nothing to do.", WEBHOOK_URL)
+            return
 
-        logger.info(f"Attempting to set webhook to: {WEBHOOK_URL}")
-        # Use TelegramUpdateType.ALL_TYPES for allowed_updates
-        await application.bot.set_webhook(url=WEBHOOK_URL, allowed_updates=Update.ALL_TYPES)
-        logger.info(f"Webhook successfully set to: {WEBHOOK_URL}")
-        logger.info(f"Verification URL: https://api.telegram.org/bot<YOUR_BOT_TOKEN>/getWebhookInfo")
+        logger.info("Attempting to set webhook to: %s", WEBHOOK_URL)
+        # Subscribe only to the update types the bot's handlers consume.
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL,
+            allowed_updates=ALLOWED_UPDATES,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            drop_pending_updates=False
+        )
+        logger.info("Webhook successfully set to: %s", WEBHOOK_URL)
+        logger.info("Verification URL: https://api.telegram.org/bot<YOUR_BOT_TOKEN>/getWebhookInfo")
     except Exception as e:
-        logger.error(f"Failed to set Telegram webhook: {e}", exc_info=True)
+        logger.error("Failed to set Telegram webhook: %s", e, exc_info=True)
 
 if __name__ == "__main__":
     logger.info("Starting webhook setter script...")
@@ -1,15 +1,22 @@
 import os
+import html
+import queue
+import atexit
 import logging
-import json
+import logging.handlers
 import asyncio
-from flask import Flask, request, jsonify
+from functools import lru_cache
+import orjson
+from quart import Quart, Response, request
 from dotenv import load_dotenv
+from cachetools import TTLCache
+from redis.asyncio import Redis
 
 # --- Core Telegram Imports ---
-from telegram import Update, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
-from telegram.ext import Application, ChatJoinRequestHandler, CommandHandler, MessageHandler, ContextTypes, filters
+from telegram import Message, Update, User, InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram.ext import AIORateLimiter, Application, CallbackQueryHandler, ChatJoinRequestHandler, CommandHandler, MessageHandler, ContextTypes, filters
 # --- Constants Imports ---
-from telegram.constants import ParseMode, ChatType
+from telegram.constants import ParseMode, MessageLimit
 # --- Error Handling Import ---
 from telegram.error import TelegramError
 
@@ -17,16 +24,30 @@ from telegram.error import TelegramError
 load_dotenv()
 
 # --- Configure Logging ---
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Records are handed to a queue on the event loop thread; a listener thread does the
+# actual stream writes, so a slow stderr never blocks request handling.
+log_queue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+log_listener = logging.handlers.QueueListener(log_queue, log_stream_handler)
+logging.getLogger().addHandler(logging.handlers.QueueHandler(log_queue))
+logging.getLogger().setLevel(logging.INFO)
+log_listener.start()
+atexit.register(log_listener.stop)
 logging.getLogger("httpx").setLevel(logging.WARNING) # Suppress httpx library warnings
 logger = logging.getLogger(__name__)
 
-# --- Configuration Variables (Global for easy access by Flask routes) ---
+# --- Configuration Variables (Global for easy access by Quart routes) ---
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID")
+# Either a numeric chat ID or a public channel's "@username". Parsed once here so a
+# malformed value fails at startup rather than on the first verified user.
+ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID") or None
+if ADMIN_CHAT_ID and not ADMIN_CHAT_ID.startswith("@"):
+    try:
+        ADMIN_CHAT_ID = int(ADMIN_CHAT_ID)
+    except ValueError:
+        logger.critical("ADMIN_CHAT_ID must be a numeric chat ID or an @username, got '%s'.", ADMIN_CHAT_ID)
+        raise ValueError("ADMIN_CHAT_ID must be a numeric chat ID or an @username.") from None
 
 RENDER_EXTERNAL_HOSTNAME = os.getenv("RENDER_EXTERNAL_HOSTNAME")
 # The WEBHOOK_URL is primarily for the set_webhook.py script now
@@ -36,31 +57,179 @@ if not RENDER_EXTERNAL_HOSTNAME:
 
 PORT = int(os.getenv("PORT", 5000))
 
-# --- Initialize Flask Application ---
-app = Flask(__name__)
+# Optional: keep pending join requests in Redis so they survive restarts and redeploys.
+REDIS_URL = os.getenv("REDIS_URL")
+
+# How join requests are verified: "contact" asks the user to share their phone number,
+# "button" only asks them to tap an inline "I'm human" button (one Bot API call fewer per user).
+VERIFICATION_METHODS = ("contact", "button")
+VERIFICATION_METHOD = os.getenv("VERIFICATION_METHOD", "contact").lower()
+
+# --- Initialize Quart Application ---
+# Served by an ASGI server so every webhook shares one long-lived event loop
+# (see hypercorn_conf.py for the worker setup):
+#   hypercorn --config file:hypercorn_conf.py telegram_flask_verification_bot:app
+app = Quart(__name__)
 
 # --- Global Application Instance (will be initialized by create_application) ---
 application = None
 
-# Dictionary to store pending join requests awaiting verification.
-pending_join_requests = {}
+# --- Pending Join Requests ---
+PENDING_REQUEST_TTL = 3600 # Seconds a join request waits for verification before it is declined
+PENDING_REQUEST_MAXSIZE = 100_000
+EXPIRED_REQUEST_SWEEP_INTERVAL = 600 # Seconds between sweeps that decline expired join requests
+
+class PendingJoinRequests(TTLCache):
+    """TTLCache of join requests awaiting verification, keyed by user ID.
 
-# --- Helper Function for MarkdownV2 Escaping (NEW) ---
-def escape_markdown_v2_text(text: str) -> str:
-    """Escapes characters in a string for MarkdownV2 text (non-URL/non-code) contexts.
-    Reference: https://core.telegram.org/bots/api#markdownv2-style
+    Entries dropped by expiry or by the size bound are kept in `dropped_requests`
+    as (user_id, entry) pairs so they can be declined on Telegram's side
+    instead of lingering there.
     """
-    chars_to_escape = r'_*[]()~>#+-=|{}.!'
-    
-    # Escape backslash first to prevent issues with subsequent escapes
-    text = text.replace('\\', '\\\\')
-    
-    for char in chars_to_escape:
-        text = text.replace(char, f'\\{char}')
-    return text
+
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.dropped_requests = []
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.dropped_requests.extend(expired)
+        return expired
+
+    def popitem(self):
+        item = super().popitem()
+        self.dropped_requests.append(item)
+        return item
+
+    def drain_dropped(self):
+        """Expires stale entries and returns every (user_id, entry) pair dropped since the last call."""
+        self.expire()
+        dropped, self.dropped_requests = self.dropped_requests, []
+        return dropped
+
+# Join requests awaiting verification, bounded in both size and age.
+# Used when REDIS_URL is not set; it lives in process memory and is lost on restart.
+pending_join_requests = PendingJoinRequests(maxsize=PENDING_REQUEST_MAXSIZE, ttl=PENDING_REQUEST_TTL)
+
+# When REDIS_URL is set, pending join requests are instead kept in Redis, through the
+# client stored in bot_data["redis"] by create_application. Keys expire server-side,
+# so requests that time out there are not declined by the sweep job.
+
+def _pending_key(user_id: int) -> str:
+    return f"pend:{user_id}"
+
+async def save_pending_request(context: ContextTypes.DEFAULT_TYPE, user_id: int, chat_id: int, chat_title: str) -> None:
+    """Stores the fields needed to approve a user's join request once they verify."""
+    entry = {"user_id": user_id, "chat_id": chat_id, "chat_title": chat_title}
+    redis_client = context.bot_data.get("redis")
+    if redis_client:
+        await redis_client.set(_pending_key(user_id), orjson.dumps(entry), ex=PENDING_REQUEST_TTL)
+    else:
+        pending_join_requests[user_id] = entry
+
+async def pop_pending_request(context: ContextTypes.DEFAULT_TYPE, user_id: int) -> dict | None:
+    """Removes and returns a user's pending join request, or None if there is none."""
+    redis_client = context.bot_data.get("redis")
+    if redis_client:
+        raw_entry = await redis_client.getdel(_pending_key(user_id))
+        return orjson.loads(raw_entry) if raw_entry is not None else None
+    return pending_join_requests.pop(user_id, None)
+
+async def has_pending_request(context: ContextTypes.DEFAULT_TYPE, user_id: int) -> bool:
+    """Returns whether a user has a join request awaiting verification."""
+    redis_client = context.bot_data.get("redis")
+    if redis_client:
+        return bool(await redis_client.exists(_pending_key(user_id)))
+    return user_id in pending_join_requests
+
+# --- Admin Notifications ---
+ADMIN_BATCH_MAX = 20 # Notifications combined per batch at most
+ADMIN_MESSAGE_SEPARATOR = "\n\n"
+ADMIN_SEND_SPACING = 1.05 # Seconds between consecutive sends, for Telegram's 1 msg/sec per chat limit
+
+# HTML template of the admin notification; values are escaped by queue_admin_notification.
+_ADMIN_TMPL = (
+    "✅ <b>New User Verified and Joined!</b>\n"
+    "<b>Group:</b> {group}\n"
+    "<b>User ID:</b> <code>{uid}</code>\n"
+    "<b>Name:</b> {name}\n"
+    "<b>Username:</b> @{uname}\n"
+    "{phone_line}"
+    '<a href="tg://user?id={uid}">View User Profile</a>'
+)
+_ADMIN_PHONE_LINE = "<b>Phone:</b> <code>{phone}</code>\n"
+
+# Verification notifications waiting to be sent to ADMIN_CHAT_ID; None tells the worker to stop.
+admin_queue = asyncio.Queue()
+
+# Task running admin_notification_worker while the server is up.
+admin_worker_task = None
+
+@lru_cache(maxsize=4096)
+def _escaped_title(chat_id: int, title: str) -> str:
+    """HTML-escapes a chat title once per chat; the title is part of the key so a rename misses the cache."""
+    return html.escape(title, quote=False)
+
+def queue_admin_notification(user: User, chat_id: int, group_name: str, phone_number: str | None = None) -> None:
+    """Queues the admin notification for a verified user; the phone line is only included for contact verification."""
+    if not ADMIN_CHAT_ID:
+        logger.warning("ADMIN_CHAT_ID not set, skipping admin notification.")
+        return
+
+    # HTML only needs <, > and & escaped in user-controlled text.
+    # Usernames are limited to [A-Za-z0-9_] and need no escaping.
+    escaped_group_name = _escaped_title(chat_id, group_name)
+    escaped_user_full_name = html.escape(user.full_name, quote=False)
+
+    admin_notification_text = _ADMIN_TMPL.format(
+        group=escaped_group_name,
+        uid=user.id,
+        name=escaped_user_full_name,
+        uname=user.username or 'N/A',
+        phone_line=_ADMIN_PHONE_LINE.format(phone=phone_number) if phone_number else ""
+    )
+
+    # Sent in batches by admin_notification_worker to stay under the per-chat rate limit.
+    admin_queue.put_nowait(admin_notification_text)
+    logger.info("Queued verification notification to admin chat %s for user %s.", ADMIN_CHAT_ID, user.id)
+
+# --- Reply Keyboards (built once, reused by every handler) ---
+VERIFY_KEYBOARD = ReplyKeyboardMarkup(
+    [[KeyboardButton("I am not a bot", request_contact=True)]],
+    one_time_keyboard=True,
+    resize_keyboard=True
+)
+REMOVE_KEYBOARD = ReplyKeyboardRemove()
+
+# --- Verification Prompt (contact method) ---
+_VERIFY_TMPL = (
+    "Welcome! To complete your request to join '{title}' and verify you are not a bot, "
+    "please tap the button below to share your details with telegram server.\n\n"
+    "This helps us ensure a real person is joining. Your data "
+    "will only be used for verification purposes via telegram servers. \n\n"
+    "Telegram will ask for your confirmation, but dont worry we respect telegram privacy policy and we dont have access to any of the data you share with telegram server. \n\n"
+    "We just revieve response that u are not a bot after confirmation. We dont collect or even take your data. No worries.\n\n"
+    "Click if you are not a bot"
+)
+
+@lru_cache(maxsize=1024)
+def _verify_text(title: str) -> str:
+    """Builds the verification prompt for a group, with its title escaped for HTML parse mode."""
+    return _VERIFY_TMPL.format(title=html.escape(title, quote=False))
+
+# --- Message Filters ---
+PRIVATE_CONTACT_FILTER = filters.CONTACT & filters.ChatType.PRIVATE
+PRIVATE_TEXT_FILTER = filters.TEXT & filters.ChatType.PRIVATE
+
+# callback_data prefix of the inline "I'm human" button; the user ID follows it.
+VERIFY_CALLBACK_PREFIX = "verify:"
 
 # --- Telegram Bot Handlers (Logic) ---
 
+async def _prompt_verify(message: Message, text: str) -> None:
+    """Replies to a message and re-offers the "I am not a bot" contact button."""
+    await message.reply_text(text, reply_markup=VERIFY_KEYBOARD)
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles the /start command in private chats."""
     user = update.effective_user
@@ -69,7 +238,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             rf"Hi {user.mention_html()}! I manage group join requests. "
             "If you're trying to join a group, I'll send you a verification message here first to verify if u are a bot with our server side validation with no errors. You can use us in our group to prevent bot spams.🙂"
         )
-        logger.info(f"User {user.id} started the bot in DM.")
+        logger.info("User %s started the bot in DM.", user.id)
     else:
         logger.warning("Received start command without effective user.")
 
@@ -80,47 +249,94 @@ async def handle_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE
     chat = chat_join_request.chat
 
     logger.info(
-        f"Received join request for chat '{chat.title}' (ID: {chat.id}) "
-        f"from user '{user.full_name}' (ID: {user.id}). Storing for verification."
+        "Received join request for chat '%s' (ID: %s) from user '%s' (ID: %s). Storing for verification.",
+        chat.title, chat.id, user.full_name, user.id
     )
 
-    pending_join_requests[user.id] = chat_join_request
+    await save_pending_request(context, user.id, chat.id, chat.title)
 
-    keyboard = [
-        [KeyboardButton("I am not a bot", request_contact=True)]
-    ]
-    reply_markup = ReplyKeyboardMarkup(
-        keyboard,
-        one_time_keyboard=True,
-        resize_keyboard=True
-    )
-
-    verification_message_text = (
-        f"Welcome! To complete your request to join '{chat.title}' and verify you are not a bot, "
-        "please tap the button below to share your details with telegram server.\n\n"
-        "This helps us ensure a real person is joining. Your data "
-        "will only be used for verification purposes via telegram servers. \n\n"
-        "Telegram will ask for your confirmation, but dont worry we respect telegram privacy policy and we dont have access to any of the data you share with telegram server. \n\n"
-        "We just revieve response that u are not a bot after confirmation. We dont collect or even take your data. No worries.\n\n"
-        "Click if you are not a bot"
-    )
+    if VERIFICATION_METHOD == "button":
+        await send_verify_button(context, user.id, chat.title)
+        return
 
     try:
         await context.bot.send_message(
             chat_id=user.id,
-            text=verification_message_text,
-            reply_markup=reply_markup,
+            text=_verify_text(chat.title),
+            reply_markup=VERIFY_KEYBOARD,
             parse_mode=ParseMode.HTML
         )
-        logger.info(f"Sent verification prompt to user {user.id} in DM for chat '{chat.title}'.")
+        logger.info("Sent verification prompt to user %s in DM for chat '%s'.", user.id, chat.title)
+    except Exception as e:
+        logger.error(
+            "Failed to send verification prompt to user %s for chat '%s'. Error: %s. Removing from pending requests.",
+            user.id, chat.title, e,
+            exc_info=True
+        )
+        await pop_pending_request(context, user.id)
+
+
+async def send_verify_button(context: ContextTypes.DEFAULT_TYPE, user_id: int, chat_title: str) -> None:
+    """Sends the inline "I'm human" button used by the "button" verification method."""
+    reply_markup = InlineKeyboardMarkup(
+        [[InlineKeyboardButton("I'm human", callback_data=f"{VERIFY_CALLBACK_PREFIX}{user_id}")]]
+    )
+    try:
+        await context.bot.send_message(
+            chat_id=user_id,
+            text=f"Welcome! To complete your request to join '{chat_title}', tap the button below to confirm you are not a bot.",
+            reply_markup=reply_markup
+        )
+        logger.info("Sent verification button to user %s in DM for chat '%s'.", user_id, chat_title)
     except Exception as e:
         logger.error(
-            f"Failed to send verification prompt to user {user.id} for chat '{chat.title}'. "
-            f"Error: {e}. Removing from pending requests.",
+            "Failed to send verification button to user %s for chat '%s'. Error: %s. Removing from pending requests.",
+            user_id, chat_title, e,
             exc_info=True
         )
-        if user.id in pending_join_requests:
-            del pending_join_requests[user.id]
+        await pop_pending_request(context, user_id)
+
+
+async def handle_verify_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Approves the pending join request of the user who tapped their "I'm human" button."""
+    query = update.callback_query
+    user = query.from_user
+
+    if query.data != f"{VERIFY_CALLBACK_PREFIX}{user.id}":
+        logger.warning("User %s tapped a verification button that belongs to someone else.", user.id)
+        await query.answer("This button is not for you.", show_alert=True)
+        return
+
+    pending_request = await pop_pending_request(context, user.id)
+    if pending_request is None:
+        logger.warning("User %s tapped the verification button, but no pending join request found for them.", user.id)
+        await query.answer(
+            "You're not currently awaiting verification. If you were trying to join a group, "
+            "please send the join request again.",
+            show_alert=True
+        )
+        return
+
+    group_name = pending_request["chat_title"]
+    try:
+        await context.bot.approve_chat_join_request(chat_id=pending_request["chat_id"], user_id=user.id)
+    except Exception as e:
+        logger.error(
+            "Failed to approve join request for user %s to group '%s' after verification. Error: %s",
+            user.id, group_name, e, exc_info=True
+        )
+        await query.answer(
+            "Verification successful, but I couldn't approve your request. Please contact a group administrator.",
+            show_alert=True
+        )
+        return
+
+    logger.info(
+        "Approved join request for user '%s' (ID: %s) to group '%s' after button verification.",
+        user.full_name, user.id, group_name
+    )
+    await query.answer(f"Thank you for verifying! Your request to join '{group_name}' has been approved.", show_alert=True)
+    queue_admin_notification(user, pending_request["chat_id"], group_name)
 
 
 async def handle_contact_shared(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -132,140 +348,220 @@ async def handle_contact_shared(update: Update, context: ContextTypes.DEFAULT_TY
     if contact and contact.user_id == user.id:
         phone_number = contact.phone_number
         logger.info(
-            f"User {user.full_name} (ID: {user.id}) successfully shared phone number: {phone_number}. "
-            f"User details: First Name: {user.first_name}, Last Name: {user.last_name}, "
-            f"Username: @{user.username if user.username else 'N/A'}"
+            "User %s (ID: %s) successfully shared phone number: %s. "
+            "User details: First Name: %s, Last Name: %s, Username: @%s",
+            user.full_name, user.id, phone_number, user.first_name, user.last_name, user.username or 'N/A'
         )
 
-        if user.id in pending_join_requests:
-            original_join_request = pending_join_requests.pop(user.id)
-            group_name = original_join_request.chat.title
+        pending_request = await pop_pending_request(context, user.id)
+        if pending_request is not None:
+            group_name = pending_request["chat_title"]
 
+            # The confirmation is only sent once the approval has succeeded, so the user is never told
+            # something that turns out to be false; Bot API failures are logged on one line, as in error_handler.
             try:
-                await original_join_request.approve()
-                logger.info(
-                    f"Approved join request for user '{user.full_name}' (ID: {user.id}) "
-                    f"to group '{group_name}' after successful phone verification."
-                )
-
-                await message.reply_text(
-                    f"Thank you for verifying! Your request to join '{group_name}' has been approved. "
-                    "You are all set! You can now access the group.",
-                    reply_markup=ReplyKeyboardRemove()
-                )
-
-                if ADMIN_CHAT_ID:
-                    try:
-                        # Apply comprehensive MarkdownV2 escaping to dynamic text
-                        # IMPORTANT: Ensure escape_markdown_v2_text is defined above this.
-                        escaped_group_name = escape_markdown_v2_text(group_name)
-                        escaped_user_full_name = escape_markdown_v2_text(user.full_name)
-
-                        admin_notification_text = (
-                            f"✅ \\*\\*New User Verified and Joined\\!\\*\\*\n"
-                            f"\\*\\*Group:\\*\\* {escaped_group_name}\n"
-                            f"\\*\\*User ID:\\*\\* `{user.id}`\n"
-                            f"\\*\\*Name:\\*\\* {escaped_user_full_name}\n"
-                            f"\\*\\*Username:\\*\\* @{escape_markdown_v2_text(user.username) if user.username else 'N/A'}\n"
-                            f"\\*\\*Phone:\\*\\* `{phone_number}`\n"
-                            f"[View User Profile](tg://user?id={user.id})"
-                        )
-                        await context.bot.send_message(
-                            chat_id=ADMIN_CHAT_ID,
-                            text=admin_notification_text,
-                            parse_mode=ParseMode.MARKDOWN_V2
-                        )
-                        logger.info(f"Sent verification notification to admin chat {ADMIN_CHAT_ID} for user {user.id}.")
-                    except Exception as admin_notify_error:
-                        logger.error(f"Failed to send admin notification for user {user.id}: {admin_notify_error}", exc_info=True)
-                else:
-                    logger.warning("ADMIN_CHAT_ID not set, skipping admin notification.")
-
-            except Exception as e:
+                await context.bot.approve_chat_join_request(chat_id=pending_request["chat_id"], user_id=user.id)
+            except TelegramError as e:
                 logger.error(
-                    f"Failed to approve join request for user {user.id} to group '{group_name}' "
-                    f"after verification. Error: {e}", exc_info=True
+                    "Failed to approve join request for user %s to group '%s' after verification. kind=%s msg=%s",
+                    user.id, group_name, type(e).__name__, str(e)[:200]
                 )
                 await message.reply_text(
                     f"Verification successful, but I encountered an issue approving your request to join '{group_name}'. "
                     "Please contact a group administrator. Apologies for the inconvenience.",
-                    reply_markup=ReplyKeyboardRemove()
+                    reply_markup=REMOVE_KEYBOARD
+                )
+            else:
+                logger.info(
+                    "Approved join request for user '%s' (ID: %s) to group '%s' after successful phone verification.",
+                    user.full_name, user.id, group_name
+                )
+                queue_admin_notification(user, pending_request["chat_id"], group_name, phone_number)
+                await message.reply_text(
+                    f"Thank you for verifying! Your request to join '{group_name}' has been approved. "
+                    "You are all set! You can now access the group.",
+                    reply_markup=REMOVE_KEYBOARD
                 )
         else:
-            logger.warning(f"User {user.id} shared contact, but no pending join request found for them.")
-            await message.reply_text(
+            logger.warning("User %s shared contact, but no pending join request found for them.", user.id)
+            await _prompt_verify(
+                message,
                 "Thanks for sharing your contact! It seems you're not currently awaiting verification "
                 "for a group join request through this bot. If you were trying to join a group, "
-                "please try sending the join request again to the group.",
-                reply_markup=ReplyKeyboardMarkup(
-                    [[KeyboardButton("I am not a bot", request_contact=True)]],
-                    one_time_keyboard=True, resize_keyboard=True
-                )
+                "please try sending the join request again to the group."
             )
     else:
-        logger.warning(f"User {user.id} sent invalid contact data or user_id mismatch.")
-        await message.reply_text(
+        logger.warning("User %s sent invalid contact data or user_id mismatch.", user.id)
+        await _prompt_verify(
+            message,
             "It seems like the contact shared was not valid or not your own. "
-            "Please tap the 'I am not a bot' button again if it's still there.",
-            reply_markup=ReplyKeyboardMarkup(
-                [[KeyboardButton("I am not a bot", request_contact=True)]],
-                one_time_keyboard=True, resize_keyboard=True
-            )
+            "Please tap the 'I am not a bot' button again if it's still there."
         )
 
+# Replies the fallback handler sends per user within the window; further messages are
+# ignored so a DM flood can't turn into outbound Bot API traffic.
+FALLBACK_REPLY_LIMIT = 2
+FALLBACK_REPLY_WINDOW = 10 # Seconds
+_fallback_bucket = TTLCache(maxsize=50_000, ttl=FALLBACK_REPLY_WINDOW)
+
 async def fallback_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles any other text messages in private chat."""
     user = update.effective_user
     if user and update.message and update.message.text:
-        if user.id in pending_join_requests:
-            await update.message.reply_text(
-                "Please complete the verification by tapping the 'I am not a bot' button. "
-                "If you don't see it, it might have disappeared; you can type /start or "
-                "re-send your group join request to receive the button again.",
-                reply_markup=ReplyKeyboardMarkup(
-                    [[KeyboardButton("I am not a bot", request_contact=True)]],
-                    one_time_keyboard=True, resize_keyboard=True
+        replies_sent = _fallback_bucket.get(user.id, 0)
+        if replies_sent >= FALLBACK_REPLY_LIMIT:
+            return
+        _fallback_bucket[user.id] = replies_sent + 1
+
+        if await has_pending_request(context, user.id):
+            if VERIFICATION_METHOD == "button":
+                await update.message.reply_text(
+                    "Please complete the verification by tapping the \"I'm human\" button in my previous message. "
+                    "If you don't see it, re-send your group join request to receive the button again."
+                )
+            else:
+                await _prompt_verify(
+                    update.message,
+                    "Please complete the verification by tapping the 'I am not a bot' button. "
+                    "If you don't see it, it might have disappeared; you can type /start or "
+                    "re-send your group join request to receive the button again."
                 )
-            )
         else:
             await update.message.reply_text(
                 "I'm designed to manage group join requests. Please send a join request to a group I manage, or type /start."
             )
     else:
-        logger.warning(f"Received non-text message or message without text from user {user.id}")
+        logger.warning("Received non-text message or message without text from user %s", user.id if user else None)
+
+
+async def decline_expired_join_requests(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Periodic job: declines join requests that were never verified before leaving the pending cache."""
+    for user_id, entry in pending_join_requests.drain_dropped():
+        try:
+            await context.bot.decline_chat_join_request(chat_id=entry["chat_id"], user_id=user_id)
+            logger.info("Declined expired join request from user %s to chat %s.", user_id, entry["chat_id"])
+        except TelegramError as e:
+            logger.warning("Failed to decline expired join request from user %s: %s", user_id, e)
+
+
+async def send_admin_notifications(bot, notifications: list[str]) -> None:
+    """Sends notifications to the admin chat combined into as few messages as fit Telegram's length limit."""
+    batches = [notifications[0]]
+    for notification in notifications[1:]:
+        if len(batches[-1]) + len(ADMIN_MESSAGE_SEPARATOR) + len(notification) <= MessageLimit.MAX_TEXT_LENGTH:
+            batches[-1] += ADMIN_MESSAGE_SEPARATOR + notification
+        else:
+            batches.append(notification)
+
+    for index, batch in enumerate(batches):
+        if index:
+            await asyncio.sleep(ADMIN_SEND_SPACING)
+        try:
+            await bot.send_message(chat_id=ADMIN_CHAT_ID, text=batch, parse_mode=ParseMode.HTML)
+        except Exception as e:
+            logger.error("Failed to send admin notification batch to chat %s: %s", ADMIN_CHAT_ID, e, exc_info=True)
+    logger.info(
+        "Sent %d verification notification(s) to admin chat %s in %d message(s).",
+        len(notifications), ADMIN_CHAT_ID, len(batches)
+    )
+
+async def admin_notification_worker(bot) -> None:
+    """Background task: sends queued notifications as they arrive, coalescing whatever queued up during the previous send."""
+    while True:
+        notification = await admin_queue.get()
+        if notification is None:
+            return
+
+        notifications = [notification]
+        stopping = False
+        while len(notifications) < ADMIN_BATCH_MAX and not admin_queue.empty():
+            notification = admin_queue.get_nowait()
+            if notification is None:
+                stopping = True
+                break
+            notifications.append(notification)
+
+        await send_admin_notifications(bot, notifications)
+        if stopping:
+            return
+        await asyncio.sleep(ADMIN_SEND_SPACING)
+
+
+# --- Error Handling ---
+
+async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Logs errors raised while processing updates."""
+    update_id = update.update_id if isinstance(update, Update) else None
+    if isinstance(context.error, TelegramError):
+        # Expected during Bot API outages; a one-line log avoids formatting a traceback per update.
+        logger.error("webhook_error update=%s kind=%s msg=%s", update_id, type(context.error).__name__, str(context.error)[:200])
+    else:
+        logger.error("Unhandled exception while processing update %s: %s", update_id, context.error, exc_info=context.error)
+
 
+# --- Quart Routes ---
 
-# --- Flask Routes ---
+# Serialized once: the success response is identical for every update.
+WEBHOOK_OK_BODY = orjson.dumps({"status": "ok"})
+
+def json_response(payload: dict, status: int = 200) -> Response:
+    """Builds a JSON response serialized with orjson."""
+    return Response(orjson.dumps(payload), status=status, mimetype="application/json")
 
 @app.route('/')
 async def root_route():
     """Simple root route for health checks or basic info."""
     status_message = "Telegram Bot Webhook Listener is Live and Operational!"
-    logger.info(f"Root route accessed. Status: {status_message}")
+    logger.info("Root route accessed. Status: %s", status_message)
     return status_message, 200
 
 @app.route('/webhook', methods=['POST'])
 async def webhook():
     """Handles incoming Telegram webhook updates."""
-    if not application:
+    if not application or not application.running:
         logger.error("Application instance not initialized when webhook received!")
-        return jsonify({"status": "error", "message": "Bot application not ready"}), 503
+        return json_response({"status": "error", "message": "Bot application not ready"}, 503)
 
     try:
-        json_data = request.get_json(force=True)
+        json_data = orjson.loads(await request.get_data())
         update = Update.de_json(json_data, application.bot)
 
-        async with application:
-            await application.process_update(update)
+        # Acknowledge Telegram right away; the handlers run as a background task
+        # so a slow Bot API round-trip can't trigger a redelivery of this update.
+        application.create_task(application.process_update(update), update=update)
 
-        return jsonify({"status": "ok"})
+        return Response(WEBHOOK_OK_BODY, mimetype="application/json")
 
-    except TelegramError as e:
-        logger.error(f"Telegram API or Update processing error in webhook: {e}", exc_info=True)
-        return jsonify({"status": "error", "message": f"Telegram processing error: {e}"}), 500
     except Exception as e:
-        logger.error(f"Unhandled exception in webhook route: {e}", exc_info=True)
-        return jsonify({"status": "error", "message": "Internal Server Error"}), 500
+        logger.error("Unhandled exception in webhook route: %s", e, exc_info=True)
+        return json_response({"status": "error", "message": "Internal Server Error"}, 500)
+
+
+# --- Application Lifecycle ---
+
+@app.before_serving
+async def startup_application():
+    """Initializes and starts the PTB Application once on the server's event loop."""
+    await application.initialize()
+    await application.start()
+    if ADMIN_CHAT_ID:
+        global admin_worker_task
+        admin_worker_task = asyncio.create_task(admin_notification_worker(application.bot))
+    logger.info("PTB Application started on the serving event loop.")
+
+@app.after_serving
+async def shutdown_application():
+    """Stops the PTB Application and closes its HTTP connection pool when the server exits (e.g. on SIGTERM)."""
+    await application.stop()
+    if admin_worker_task:
+        # Queued last, so the worker sends everything still pending before it exits.
+        admin_queue.put_nowait(None)
+        await admin_worker_task
+    await application.shutdown()
+    redis_client = application.bot_data.get("redis")
+    if redis_client:
+        await redis_client.aclose()
+    logger.info("PTB Application stopped and shut down.")
 
 
 # --- Application Initialization ---
@@ -276,17 +572,52 @@ def create_application():
     if not BOT_TOKEN:
         logger.critical("TELEGRAM_BOT_TOKEN environment variable is not set!")
         raise ValueError("TELEGRAM_BOT_TOKEN is required.")
+    if VERIFICATION_METHOD not in VERIFICATION_METHODS:
+        logger.critical("Invalid VERIFICATION_METHOD '%s', expected one of %s.", VERIFICATION_METHOD, VERIFICATION_METHODS)
+        raise ValueError(f"VERIFICATION_METHOD must be one of {VERIFICATION_METHODS}.")
+
+    # Updates already run concurrently (one webhook task each, handlers with block=False),
+    # so size the httpx pool for many in-flight Bot API calls at once.
+    # HTTP/2 multiplexes concurrent Bot API calls over a single connection.
+    ptb_application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .http_version("2")
+        .connection_pool_size(512)
+        .pool_timeout(30.0)
+        .connect_timeout(10.0)
+        .read_timeout(30.0)
+        # Stay below Telegram's 30 msg/sec global and 20 msg/min per-group limits
+        # rather than hitting 429s and backing off.
+        .rate_limiter(AIORateLimiter(
+            overall_max_rate=28,
+            overall_time_period=1,
+            group_max_rate=18,
+            group_time_period=60,
+            max_retries=3
+        ))
+        .build()
+    )
 
-    ptb_application = Application.builder().token(BOT_TOKEN).build()
-
-    ptb_application.loop = asyncio.get_event_loop()
-    logger.info("DEBUG: Explicitly set ptb_application.loop to: %s", ptb_application.loop)
+    # Pending-request store that outlives the process.
+    if REDIS_URL:
+        ptb_application.bot_data["redis"] = Redis.from_url(REDIS_URL)
 
     # --- Register Handlers ---
-    ptb_application.add_handler(CommandHandler("start", start))
-    ptb_application.add_handler(ChatJoinRequestHandler(handle_join_request))
-    ptb_application.add_handler(MessageHandler(filters.CONTACT & filters.ChatType.PRIVATE, handle_contact_shared))
-    ptb_application.add_handler(MessageHandler(filters.TEXT & filters.ChatType.PRIVATE, fallback_message_handler))
+    # block=False: each callback runs as its own task, so one slow handler never holds up another.
+    ptb_application.add_handler(CommandHandler("start", start, block=False))
+    ptb_application.add_handler(ChatJoinRequestHandler(handle_join_request, block=False))
+    ptb_application.add_handler(CallbackQueryHandler(handle_verify_button, pattern=f"^{VERIFY_CALLBACK_PREFIX}", block=False))
+    ptb_application.add_handler(MessageHandler(PRIVATE_CONTACT_FILTER, handle_contact_shared, block=False))
+    ptb_application.add_handler(MessageHandler(PRIVATE_TEXT_FILTER, fallback_message_handler, block=False))
+    ptb_application.add_error_handler(error_handler)
+
+    # --- Register Jobs ---
+    ptb_application.job_queue.run_repeating(
+        decline_expired_join_requests,
+        interval=EXPIRED_REQUEST_SWEEP_INTERVAL,
+        first=EXPIRED_REQUEST_SWEEP_INTERVAL
+    )
 
     logger.info("PTB Application initialized and handlers added.")
     return ptb_application
@@ -295,9 +626,9 @@ def create_application():
 if __name__ == "__main__":
     logger.info("Running in __main__ block (local development mode likely).")
     application = create_application()
-    logger.info(f"Starting Flask app locally on port {PORT}...")
+    logger.info("Starting Quart app locally on port %s...", PORT)
     app.run(host="0.0.0.0", port=PORT, debug=True)
 else:
-    logger.info("Running as a Gunicorn worker (production mode likely).")
+    logger.info("Running as an ASGI worker (production mode likely).")
     application = create_application()
-    logger.info("Gunicorn worker loaded PTB Application.")
+    logger.info("ASGI worker loaded PTB Application.")